@@ -3,38 +3,479 @@ IBKR Activity Statement Tax Processor for Basel-Landschaft Canton
 Processes IBKR CSV statements and generates Swiss tax reports
 """
 
-import pandas as pd
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-import json
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Optional
 import logging
-from io import StringIO
+import csv
+import math
+import sys
+from io import BytesIO
+from itertools import chain
+from functools import lru_cache
+
+# pandas and openpyxl are only needed by to_dataframe() and the Excel report,
+# so they are imported there rather than on every run
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging. getLogger(__name__)
 
+# Section names that can appear in the first column of an IBKR statement
+_SECTION_NAMES = frozenset({
+    'Trades', 'Dividends', 'Withholding Tax', 'Fees', 'Open Positions',
+    'Cash Report', 'Interest', 'Securities Lending', 'Forex P/L'
+})
+
+# Characters removed from numeric cells before float() ("1,234.50" -> "1234.50")
+_FLOAT_STRIP = str.maketrans('', '', ', ')
+
+# Header blocks with at least this many rows are converted column-wise;
+# below it the DataFrame setup costs more than per-cell conversion
+_BULK_MIN_ROWS = 100
+
+# Strings shorter than this repeat across rows and are shared via sys.intern
+_INTERN_MAX_LEN = 16
+
+_NUMERIC_FIELDS = frozenset({
+    'quantity', 'price', 'proceeds', 'commission', 'proceeds_chf', 'commission_chf',
+    'amount', 'amount_chf', 'value_chf', 'unrealized_pl'
+})
+
+# Narrower dtypes for to_dataframe(). Prices fit float32's ~7 significant digits;
+# quantities stay float64 because Forex rows carry amounts like 1234567.89 that
+# float32 would round (to 1234567.875), and money amounts stay float64 because
+# tax totals are summed from them.
+_FLOAT32_FIELDS = frozenset({'price'})
+_CATEGORICAL_FIELDS = frozenset({'type', 'currency'})
+
+
+class Trade(NamedTuple):
+    """A row of the Trades section"""
+    type: str
+    currency: str
+    symbol: str
+    date: str
+    quantity: float
+    price: float
+    proceeds: float
+    commission: float
+    proceeds_chf: float
+    commission_chf: float
+
+
+class Dividend(NamedTuple):
+    """A row of the Dividends section, or of the Interest section with type 'Interest'"""
+    currency: str
+    date: str
+    symbol: str
+    amount: float
+    amount_chf: float
+    type: str = ''
+
+
+class WithholdingTax(NamedTuple):
+    """A row of the Withholding Tax section"""
+    currency: str
+    date: str
+    symbol: str
+    amount: float
+    amount_chf: float
+
+
+class Fee(NamedTuple):
+    """A row of the Fees section"""
+    type: str
+    currency: str
+    date: str
+    amount: float
+    amount_chf: float
+
+
+class OpenPosition(NamedTuple):
+    """A row of the Open Positions section"""
+    symbol: str
+    currency: str
+    quantity: float
+    price: float
+    value_chf: float
+    unrealized_pl: float
+
+
+# Fields of the parsed record lists, used to build their columnar views
+_RECORD_FIELDS = {
+    'transactions': Trade._fields,
+    'dividends': Dividend._fields,
+    'taxes': WithholdingTax._fields,
+    'fees': Fee._fields,
+    'open_positions': OpenPosition._fields,
+}
+
+
+def _safe_float(value: str) -> float:
+    """Safely convert a cell to float (IBKR uses ',' as thousands separator)"""
+    if not value:
+        return 0.0
+    try:
+        result = float(value.translate(_FLOAT_STRIP))
+    except ValueError:
+        return 0.0
+    # 'NaN'/'inf' cells would otherwise survive the keep mask and poison every total
+    return result if math.isfinite(result) else 0.0
+
+
+def _safe_str(value: str) -> str:
+    """Safely strip a cell, interning short values (currency, asset category, symbol)"""
+    if not value:
+        return ''
+    s = value.strip()
+    return sys.intern(s) if len(s) < _INTERN_MAX_LEN else s
+
+
+def _column(rows: List[List[str]], i: Optional[int]) -> List[str]:
+    """Extract column `i` from ragged rows, using '' where a row is too short"""
+    if i is None:
+        return [''] * len(rows)
+    return [row[i] if i < len(row) else '' for row in rows]
+
+
+def _to_floats(values: List[str]) -> np.ndarray:
+    """Convert a column of numeric cells to a float array in one vectorized pass"""
+    if not values:
+        return np.zeros(0)
+    cleaned = np.char.replace(np.char.replace(np.asarray(values, dtype=str), ',', ''), ' ', '')
+    cleaned[cleaned == ''] = '0'
+    try:
+        floats = cleaned.astype(np.float64)
+    except ValueError:
+        # A non-numeric cell somewhere in the column; fall back to per-cell parsing
+        return np.fromiter(map(_safe_float, values), dtype=np.float64, count=len(values))
+    # Non-finite cells count as 0.0, as in _safe_float
+    floats[~np.isfinite(floats)] = 0.0
+    return floats
+
+
+def _abs_float(value: str) -> float:
+    """Safely convert to a non-negative float (taxes and fees are reported negative)"""
+    return abs(_safe_float(value))
+
+
+def _currency(value: str) -> str:
+    """Currency code of a cell, defaulting to CHF"""
+    return _safe_str(value) or 'CHF'
+
+
+def _description_symbol(value: str) -> str:
+    """Symbol from a description like 'AAPL(US0378331005) Cash Dividend ...'"""
+    return _safe_str(_safe_str(value).split('(')[0])
+
+
+def _convert_distinct(convert, cells: List[str]) -> List[str]:
+    """Apply a str converter once per distinct cell, so repeated values share one object"""
+    converted = {cell: convert(cell) for cell in set(cells)}
+    return list(map(converted.__getitem__, cells))
+
+
+def _non_empty(values: List[str]) -> np.ndarray:
+    """Boolean mask of the non-empty strings in `values`"""
+    return np.fromiter(map(bool, values), dtype=bool, count=len(values))
+
+
+class _SectionSchema(NamedTuple):
+    """How the data rows of one statement section become records"""
+    target: str          # name of the IBKRTaxProcessor list the records go to
+    record: type         # record class, built positionally from its _fields
+    columns: tuple       # (field, statement column, converter)
+    chf: tuple           # (CHF field, source field) converted with fx_rates
+    required: tuple      # fields that must be non-empty / non-zero to keep a row
+    constants: tuple = ()  # (field, value) for fields not read from the statement
+
+
+_SECTION_SCHEMAS = {
+    'Trades': _SectionSchema(
+        'transactions', Trade,
+        (('type', 'Asset Category', _safe_str),
+         ('currency', 'Currency', _currency),
+         ('symbol', 'Symbol', _safe_str),
+         ('date', 'Date/Time', _safe_str),
+         ('quantity', 'Quantity', _safe_float),
+         ('price', 'T. Price', _safe_float),
+         ('proceeds', 'Proceeds', _safe_float),
+         ('commission', 'Comm/Fee', _safe_float)),
+        (('proceeds_chf', 'proceeds'), ('commission_chf', 'commission')),
+        ('symbol', 'date', 'quantity')),
+    'Dividends': _SectionSchema(
+        'dividends', Dividend,
+        (('currency', 'Currency', _currency),
+         ('date', 'Date', _safe_str),
+         ('symbol', 'Description', _description_symbol),
+         ('amount', 'Amount', _safe_float)),
+        (('amount_chf', 'amount'),),
+        ('symbol', 'date', 'amount')),
+    'Withholding Tax': _SectionSchema(
+        'taxes', WithholdingTax,
+        (('currency', 'Currency', _currency),
+         ('date', 'Date', _safe_str),
+         ('symbol', 'Description', _description_symbol),
+         ('amount', 'Amount', _abs_float)),
+        (('amount_chf', 'amount'),),
+        ('symbol', 'date', 'amount')),
+    'Fees': _SectionSchema(
+        'fees', Fee,
+        (('type', 'Description', _safe_str),
+         ('currency', 'Currency', _currency),
+         ('date', 'Date', _safe_str),
+         ('amount', 'Amount', _abs_float)),
+        (('amount_chf', 'amount'),),
+        ('date', 'amount')),
+    'Interest': _SectionSchema(
+        'dividends', Dividend,
+        (('currency', 'Currency', _currency),
+         ('date', 'Date', _safe_str),
+         ('amount', 'Amount', _safe_float)),
+        (('amount_chf', 'amount'),),
+        ('date', 'amount'),
+        (('symbol', ''), ('type', 'Interest'))),
+    'Open Positions': _SectionSchema(
+        'open_positions', OpenPosition,
+        (('symbol', 'Symbol', _safe_str),
+         ('currency', 'Currency', _currency),
+         ('quantity', 'Quantity', _safe_float),
+         ('price', 'Close Price', _safe_float),
+         ('value', 'Value', _safe_float),
+         ('unrealized_pl', 'Unrealized P/L', _safe_float)),
+        (('value_chf', 'value'),),
+        ('symbol', 'quantity')),
+}
+
+# Statement columns a section's header must have (those backing required fields)
+_REQUIRED_COLUMNS = {
+    section: tuple(column for field, column, _ in schema.columns if field in schema.required)
+    for section, schema in _SECTION_SCHEMAS.items()
+}
+
+# How each section's record count is reported once parsing is done
+_SECTION_LABELS = {
+    'Trades': 'trades',
+    'Dividends': 'dividends',
+    'Withholding Tax': 'withholding taxes',
+    'Fees': 'fees',
+    'Interest': 'interest entries',
+    'Open Positions': 'open positions',
+}
+
+# Converters producing floats; large blocks convert these columns in bulk
+_FLOAT_CONVERTERS = (_safe_float, _abs_float)
+
+
+def _field_dtype(field: str):
+    """Array dtype used for a record field in the columnar views"""
+    return np.float64 if field in _NUMERIC_FIELDS else object
+
+
+def _concat_columns(blocks: List[Dict[str, np.ndarray]], fields) -> Dict[str, np.ndarray]:
+    """Join the per-block columns of one container into a dict of per-field arrays"""
+    if not blocks:
+        return {field: np.zeros(0, dtype=_field_dtype(field)) for field in fields}
+    return {field: np.concatenate([block[field] for block in blocks]) for field in fields}
+
+
+@lru_cache(maxsize=None)
+def _header_style():
+    """Column header style shared by every report sheet (bold, centred, thin border)"""
+    from openpyxl.styles import Alignment, Border, Font, Side
+    thin = Side(style='thin')
+    return (Font(bold=True), Alignment(horizontal='center', vertical='top'),
+            Border(left=thin, right=thin, top=thin, bottom=thin))
+
+
+# Column headers of the detail sheets; dividends and interest share one layout
+_TRADES_HEADER = ('Data', 'Typ', 'Symbol', 'Ilość', 'Cena', 'Wartość CHF', 'Komisja CHF')
+_FOREX_HEADER = ('Data', 'Para walut', 'Ilość', 'Wartość CHF')
+_INCOME_HEADER = ('Data', 'Waluta', 'Kwota', 'CHF')
+_POSITIONS_HEADER = ('Symbol', 'Ilość', 'Wartość CHF', 'P&L niezrealizowany')
+_FEES_HEADER = ('Data', 'Typ', 'Symbol', 'CHF')
+
+
+def _header_cells(ws, labels: Tuple[str, ...]) -> list:
+    """Styled header row for a write-only worksheet"""
+    from openpyxl.cell import WriteOnlyCell
+    font, alignment, border = _header_style()
+    cells = []
+    for label in labels:
+        cell = WriteOnlyCell(ws, value=label)
+        cell.font = font
+        cell.alignment = alignment
+        cell.border = border
+        cells.append(cell)
+    return cells
+
+
+def _emit_sheet(wb, title: str, header: Tuple[str, ...], rows: Iterable[tuple]):
+    """Stream a detail sheet (styled header, then one row per record) into a write-only workbook"""
+    ws = wb.create_sheet(title)
+    ws.append(_header_cells(ws, header))
+    for row in rows:
+        ws.append(row)
+
+
+# Stylesheet of the HTML report
+_HTML_STYLE = """
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            padding: 20px;
+            min-height: 100vh;
+        }
+
+        .container {
+            max-width: 1200px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 10px;
+            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
+            overflow: hidden;
+        }
+
+        .header {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 40px;
+            text-align: center;
+        }
+
+        .header h1 {
+            font-size: 2.5em;
+            margin-bottom: 10px;
+        }
+
+        .header p {
+            font-size: 1.1em;
+            opacity: 0.9;
+        }
+
+        .content {
+            padding: 40px;
+        }
+
+        .summary-grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
+            gap: 20px;
+            margin-bottom: 40px;
+        }
+
+        .summary-card {
+            background: #f8f9fa;
+            border-left: 4px solid #667eea;
+            padding: 20px;
+            border-radius: 5px;
+        }
+
+        .summary-card h3 {
+            color: #667eea;
+            font-size: 0.9em;
+            text-transform: uppercase;
+            margin-bottom: 10px;
+        }
+
+        .summary-card .value {
+            font-size: 1.8em;
+            font-weight: bold;
+            color: #333;
+        }
+
+        .summary-card .unit {
+            color: #999;
+            font-size: 0.9em;
+        }
+
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            margin-top: 20px;
+        }
+
+        table thead {
+            background: #f8f9fa;
+        }
+
+        table th {
+            padding: 12px;
+            text-align: left;
+            font-weight: 600;
+            color: #667eea;
+            border-bottom: 2px solid #667eea;
+        }
+
+        table td {
+            padding: 12px;
+            border-bottom: 1px solid #eee;
+        }
+
+        table tbody tr:hover {
+            background: #f8f9fa;
+        }
+
+        .section-title {
+            font-size: 1.5em;
+            color: #667eea;
+            margin-top: 40px;
+            margin-bottom: 20px;
+            border-bottom: 2px solid #667eea;
+            padding-bottom: 10px;
+        }
+
+        .footer {
+            background: #f8f9fa;
+            padding: 20px;
+            text-align: center;
+            color: #999;
+            font-size: 0.9em;
+            border-top: 1px solid #eee;
+            margin-top: 40px;
+        }
+
+        .positive {
+            color: #28a745;
+        }
+
+        .negative {
+            color: #dc3545;
+        }
+"""
+
 
 class IBKRTaxProcessor:
     """Main processor for IBKR statements with improved CSV parsing"""
 
+    # Exchange rates (fallback - can be updated with APIs)
+    DEFAULT_FX_RATES = {
+        'EUR': 0.93324,  # EUR/CHF from your statement
+        'USD': 0.79959,  # USD/CHF
+        'JPY': 0.0051507,  # JPY/CHF
+        'NOK': 0.07952,  # NOK/CHF
+        'PLN': 0.22084,  # PLN/CHF
+        'SEK': 0.085358,  # SEK/CHF
+        'CHF': 1.0
+    }
+
     def __init__(self, csv_file: str, tax_year: int = 2025):
         self.csv_file = csv_file
         self.tax_year = tax_year
         self.canton = "Basel-Landschaft"
 
-        # Exchange rates (fallback - can be updated with APIs)
-        self.fx_rates = {
-            'EUR': 0.93324,  # EUR/CHF from your statement
-            'USD': 0.79959,  # USD/CHF
-            'JPY': 0.0051507,  # JPY/CHF
-            'NOK': 0.07952,  # NOK/CHF
-            'PLN': 0.22084,  # PLN/CHF
-            'SEK': 0.085358,  # SEK/CHF
-            'CHF': 1.0
-        }
+        # Per-instance copy so rates can be updated for one statement only
+        self.fx_rates = dict(self.DEFAULT_FX_RATES)
 
         # Data containers
         self.transactions = []
@@ -44,484 +485,190 @@ class IBKRTaxProcessor:
         self.taxes = []
         self.open_positions = []
 
-        # Summary data
-        self.summary = {}
-
-    def read_csv(self) -> pd. DataFrame:
-        """Read and parse IBKR CSV"""
-        df = pd.read_csv(self.csv_file, header=None)
-        return df
+        # Columnar views of the data containers, extended on every parse
+        self.columns = {name: _concat_columns([], fields)
+                        for name, fields in _RECORD_FIELDS.items()}
 
-    def parse_ibkr_statement(self):
-        """Parse IBKR statement into organized sections"""
-        df = self.read_csv()
-        logger.info(f"📂 Read CSV with {len(df)} rows")
-
-        # Find section markers
-        sections = {}
-        current_section = None
-        section_start = None
+        # Summary data, and its amounts formatted for the reports
+        self.summary = {}
+        self.summary_text = {}
 
-        for idx, row in df.iterrows():
-            first_col = str(row[0]). strip() if pd.notna(row[0]) else ""
+    def read_csv(self) -> Iterator[List[str]]:
+        """Stream IBKR CSV as (ragged) rows of strings"""
+        # newline='' lets the csv module handle newlines inside quoted fields
+        with open(self.csv_file, 'r', encoding='utf-8', newline='') as f:
+            yield from csv.reader(f)
 
-            # Detect section headers
-            if first_col in ['Trades', 'Dividends', 'Withholding Tax', 'Fees',
-                            'Open Positions', 'Cash Report', 'Interest', 'Securities Lending']:
-                current_section = first_col
-                section_start = idx
-                sections[current_section] = {'start': idx, 'data': []}
-                logger.debug(f"Found section: {current_section} at row {idx}")
-
-            elif current_section and section_start is not None:
-                # Check if we hit next section
-                if first_col in ['Trades', 'Dividends', 'Withholding Tax', 'Fees',
-                                'Open Positions', 'Cash Report', 'Interest', 'Securities Lending']:
-                    current_section = first_col
-                    section_start = idx
-                    sections[current_section] = {'start': idx, 'data': []}
-                else:
-                    sections[current_section]['data'].append(row)
+    def parse_ibkr_statement(self, sections: Optional[List[str]] = None):
+        """Parse IBKR statement in a single pass, dispatching rows per section
 
-        # Process each section
+        Args:
+            sections: Statement sections to parse (e.g. ['Trades', 'Dividends']);
+                rows of any other section are dropped while reading. Defaults to all.
+        """
+        if sections is None:
+            wanted = _SECTION_SCHEMAS.keys()
+        else:
+            unknown = [name for name in sections if name not in _SECTION_SCHEMAS]
+            if unknown:
+                raise ValueError(f"Unsupported sections: {unknown}")
+            wanted = frozenset(sections)
+        counts = dict.fromkeys(_SECTION_SCHEMAS, 0)
+
+        # Each block is converted as soon as the next header closes it, so
+        # records are available section by section while the file is read
         logger.info("🔄 Processing sections...")
-        if 'Trades' in sections:
-            self._process_trades_section(sections['Trades']['data'], df)
-        if 'Dividends' in sections:
-            self._process_dividends_section(sections['Dividends']['data'], df)
-        if 'Withholding Tax' in sections:
-            self._process_withholding_tax_section(sections['Withholding Tax']['data'], df)
-        if 'Fees' in sections:
-            self._process_fees_section(sections['Fees']['data'], df)
-        if 'Open Positions' in sections:
-            self._process_open_positions_section(sections['Open Positions']['data'], df)
-        if 'Interest' in sections:
-            self._process_interest_section(sections['Interest']['data'], df)
-
-    def _process_trades_section(self, section_data: List, df: pd.DataFrame):
-        """Process Trades section"""
-        logger.info("📊 Processing Trades...")
-
-        # Find header row
-        header_idx = None
-        for idx, row in df.iterrows():
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-            if first_col == 'Trades':
-                # Look for header row (usually "Header")
-                if idx + 1 < len(df):
-                    next_row = df.iloc[idx + 1]
-                    if pd.notna(next_row[0]) and 'Header' in str(next_row[0]):
-                        header_idx = idx + 1
-                        break
-
-        if header_idx is None:
-            logger.warning("⚠️ No Trades header found")
-            return
-
-        # Get header names
-        header_row = df.iloc[header_idx]
-        headers = [str(h).strip() for h in header_row if pd.notna(h)]
-        logger.debug(f"Trades headers: {headers}")
-
-        # Process data rows
-        data_start = header_idx + 1
-        count = 0
-
-        for idx in range(data_start, len(df)):
-            row = df. iloc[idx]
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-
-            # Stop at next section
-            if first_col in ['Dividends', 'Withholding Tax', 'Fees', 'Open Positions', 'Interest']:
-                break
-
-            # Skip empty rows
-            if pd.isna(row[0]):
-                continue
-
-            try:
-                # Map columns - adjust based on actual IBKR format
-                asset_type = self._safe_str(row[1]) if len(row) > 1 else ''
-                currency = self._safe_str(row[2]) if len(row) > 2 else 'CHF'
-                symbol = self._safe_str(row[3]) if len(row) > 3 else ''
-                date_str = self._safe_str(row[4]) if len(row) > 4 else ''
-                quantity = self._safe_float(row[5]) if len(row) > 5 else 0. 0
-                price = self._safe_float(row[6]) if len(row) > 6 else 0. 0
-                amount = self._safe_float(row[7]) if len(row) > 7 else 0. 0
-                commission = self._safe_float(row[8]) if len(row) > 8 else 0. 0
-
-                if symbol and date_str and quantity != 0:
-                    self.transactions.append({
-                        'type': asset_type,
-                        'currency': currency,
-                        'symbol': symbol,
-                        'date': date_str,
-                        'quantity': quantity,
-                        'price': price,
-                        'proceeds': amount,
-                        'commission': commission,
-                        'proceeds_chf': self._convert_to_chf(amount, currency),
-                        'commission_chf': self._convert_to_chf(commission, currency)
-                    })
-                    count += 1
-            except (ValueError, IndexError) as e:
-                logger.debug(f"Skipping row {idx}: {e}")
-                continue
+        for section, header, block_rows in self._iter_blocks(wanted):
+            block_columns = self._parse_block(section, header, block_rows)
+            counts[section] += len(block_columns['currency'])
 
-        logger.info(f"✅ Processed {count} trades")
-
-    def _process_dividends_section(self, section_data: List, df: pd. DataFrame):
-        """Process Dividends section"""
-        logger.info("💰 Processing Dividends...")
-
-        # Find header row
-        header_idx = None
-        for idx, row in df.iterrows():
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-            if first_col == 'Dividends':
-                if idx + 1 < len(df):
-                    next_row = df.iloc[idx + 1]
-                    if pd. notna(next_row[0]) and 'Header' in str(next_row[0]):
-                        header_idx = idx + 1
-                        break
-
-        if header_idx is None:
-            logger.warning("⚠️ No Dividends header found")
-            return
-
-        # Get header names
-        header_row = df.iloc[header_idx]
-        headers = [str(h).strip() for h in header_row if pd.notna(h)]
-        logger.debug(f"Dividends headers: {headers}")
-
-        # Process data rows
-        data_start = header_idx + 1
-        count = 0
-
-        for idx in range(data_start, len(df)):
-            row = df.iloc[idx]
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-
-            # Stop at next section
-            if first_col in ['Trades', 'Withholding Tax', 'Fees', 'Open Positions', 'Interest']:
-                break
-
-            if pd.isna(row[0]):
-                continue
-
-            try:
-                # Map columns - adjust based on actual IBKR format
-                symbol = self._safe_str(row[1]) if len(row) > 1 else ''
-                date_str = self._safe_str(row[2]) if len(row) > 2 else ''
-                currency = self._safe_str(row[3]) if len(row) > 3 else 'CHF'
-                amount = self._safe_float(row[-1])  # Last column usually has amount
-
-                if symbol and date_str and amount != 0:
-                    self.dividends.append({
-                        'currency': currency,
-                        'date': date_str,
-                        'symbol': symbol,
-                        'amount': amount,
-                        'amount_chf': self._convert_to_chf(amount, currency)
-                    })
-                    count += 1
-            except (ValueError, IndexError) as e:
-                logger.debug(f"Skipping row {idx}: {e}")
-                continue
+        for section, label in _SECTION_LABELS.items():
+            if section in wanted:
+                logger.info("✅ Processed %d %s", counts[section], label)
 
-        logger.info(f"✅ Processed {count} dividends")
-
-    def _process_withholding_tax_section(self, section_data: List, df: pd.DataFrame):
-        """Process Withholding Tax section"""
-        logger.info("🏛️ Processing Withholding Tax...")
-
-        # Find header row
-        header_idx = None
-        for idx, row in df.iterrows():
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-            if first_col == 'Withholding Tax':
-                if idx + 1 < len(df):
-                    next_row = df.iloc[idx + 1]
-                    if pd.notna(next_row[0]) and 'Header' in str(next_row[0]):
-                        header_idx = idx + 1
-                        break
-
-        if header_idx is None:
-            logger.warning("⚠️ No Withholding Tax header found")
-            return
-
-        # Get header names
-        header_row = df.iloc[header_idx]
-        headers = [str(h).strip() for h in header_row if pd.notna(h)]
-        logger.debug(f"Withholding Tax headers: {headers}")
-
-        # Process data rows
-        data_start = header_idx + 1
-        count = 0
-
-        for idx in range(data_start, len(df)):
-            row = df. iloc[idx]
-            first_col = str(row[0]). strip() if pd.notna(row[0]) else ""
-
-            # Stop at next section
-            if first_col in ['Trades', 'Dividends', 'Fees', 'Open Positions', 'Interest']:
-                break
-
-            if pd.isna(row[0]):
-                continue
+    def _iter_blocks(self, wanted) -> Iterator[Tuple[str, Dict[str, int], List[List[str]]]]:
+        """Stream the statement, yielding each complete header block of a wanted section
 
-            try:
-                # Map columns
-                symbol = self._safe_str(row[1]) if len(row) > 1 else ''
-                date_str = self._safe_str(row[2]) if len(row) > 2 else ''
-                currency = self._safe_str(row[3]) if len(row) > 3 else 'CHF'
-                amount = abs(self._safe_float(row[-1]))
-
-                if symbol and date_str and amount != 0:
-                    self.taxes.append({
-                        'currency': currency,
-                        'date': date_str,
-                        'symbol': symbol,
-                        'amount': amount,
-                        'amount_chf': abs(self._convert_to_chf(amount, currency))
-                    })
-                    count += 1
-            except (ValueError, IndexError) as e:
-                logger.debug(f"Skipping row {idx}: {e}")
-                continue
-
-        logger.info(f"✅ Processed {count} withholding taxes")
-
-    def _process_fees_section(self, section_data: List, df: pd.DataFrame):
-        """Process Fees section"""
-        logger.info("💸 Processing Fees...")
-
-        # Find header row
-        header_idx = None
-        for idx, row in df.iterrows():
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-            if first_col == 'Fees':
-                if idx + 1 < len(df):
-                    next_row = df.iloc[idx + 1]
-                    if pd.notna(next_row[0]) and 'Header' in str(next_row[0]):
-                        header_idx = idx + 1
-                        break
-
-        if header_idx is None:
-            logger.warning("⚠️ No Fees header found")
-            return
-
-        # Get header names
-        header_row = df. iloc[header_idx]
-        headers = [str(h).strip() for h in header_row if pd.notna(h)]
-        logger.debug(f"Fees headers: {headers}")
-
-        # Process data rows
-        data_start = header_idx + 1
-        count = 0
-
-        for idx in range(data_start, len(df)):
-            row = df.iloc[idx]
-            first_col = str(row[0]).strip() if pd. notna(row[0]) else ""
-
-            # Stop at next section
-            if first_col in ['Trades', 'Dividends', 'Withholding Tax', 'Open Positions', 'Interest']:
-                break
-
-            if pd.isna(row[0]):
-                continue
-
-            try:
-                # Map columns
-                fee_type = self._safe_str(row[1]) if len(row) > 1 else ''
-                date_str = self._safe_str(row[2]) if len(row) > 2 else ''
-                currency = self._safe_str(row[3]) if len(row) > 3 else 'CHF'
-                amount = abs(self._safe_float(row[-1]))
-
-                if date_str and amount != 0:
-                    self.fees.append({
-                        'type': fee_type,
-                        'currency': currency,
-                        'date': date_str,
-                        'amount': amount,
-                        'amount_chf': self._convert_to_chf(amount, currency)
-                    })
-                    count += 1
-            except (ValueError, IndexError) as e:
-                logger.debug(f"Skipping row {idx}: {e}")
-                continue
+        Yields (section, header name -> column index, data rows). A block is
+        complete when the next section header (or the end of the file) is reached;
+        rows of other sections are dropped as they are read.
+        """
+        current_section = None
+        current_block = None
 
-        logger.info(f"✅ Processed {count} fees")
-
-    def _process_interest_section(self, section_data: List, df: pd.DataFrame):
-        """Process Interest section"""
-        logger.info("📈 Processing Interest...")
-
-        # Find header row
-        header_idx = None
-        for idx, row in df.iterrows():
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-            if first_col == 'Interest':
-                if idx + 1 < len(df):
-                    next_row = df. iloc[idx + 1]
-                    if pd.notna(next_row[0]) and 'Header' in str(next_row[0]):
-                        header_idx = idx + 1
-                        break
-
-        if header_idx is None:
-            logger. warning("⚠️ No Interest header found")
-            return
-
-        # Get header names
-        header_row = df.iloc[header_idx]
-        headers = [str(h).strip() for h in header_row if pd.notna(h)]
-        logger. debug(f"Interest headers: {headers}")
-
-        # Process data rows
-        data_start = header_idx + 1
-        count = 0
-
-        for idx in range(data_start, len(df)):
-            row = df.iloc[idx]
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-
-            # Stop at next section
-            if first_col in ['Trades', 'Dividends', 'Withholding Tax', 'Fees', 'Open Positions']:
-                break
-
-            if pd. isna(row[0]):
+        idx = -1
+        for idx, row in enumerate(self.read_csv()):
+            if not row:
                 continue
 
-            try:
-                # Map columns
-                currency = self._safe_str(row[1]) if len(row) > 1 else 'CHF'
-                date_str = self._safe_str(row[2]) if len(row) > 2 else ''
-                amount = self._safe_float(row[-1])
-
-                if date_str and amount != 0:
-                    self.dividends.append({
-                        'currency': currency,
-                        'date': date_str,
-                        'amount': amount,
-                        'type': 'Interest',
-                        'amount_chf': self._convert_to_chf(amount, currency)
-                    })
-                    count += 1
-            except (ValueError, IndexError) as e:
-                logger.debug(f"Skipping row {idx}: {e}")
-                continue
+            # csv.reader yields the cells as written; IBKR section/discriminator
+            # cells carry no surrounding whitespace, so compare them as-is
+            first_col = row[0]
+            discriminator = row[1] if len(row) > 1 else ""
 
-        logger.info(f"✅ Processed {count} interest entries")
-
-    def _process_open_positions_section(self, section_data: List, df: pd.DataFrame):
-        """Process Open Positions section"""
-        logger.info("📍 Processing Open Positions...")
-
-        # Find header row
-        header_idx = None
-        for idx, row in df.iterrows():
-            first_col = str(row[0]).strip() if pd. notna(row[0]) else ""
-            if first_col == 'Open Positions':
-                if idx + 1 < len(df):
-                    next_row = df.iloc[idx + 1]
-                    if pd.notna(next_row[0]) and 'Header' in str(next_row[0]):
-                        header_idx = idx + 1
-                        break
-
-        if header_idx is None:
-            logger.warning("⚠️ No Open Positions header found")
-            return
-
-        # Get header names
-        header_row = df.iloc[header_idx]
-        headers = [str(h).strip() for h in header_row if pd.notna(h)]
-        logger.debug(f"Open Positions headers: {headers}")
-
-        # Process data rows
-        data_start = header_idx + 1
-        count = 0
-
-        for idx in range(data_start, len(df)):
-            row = df.iloc[idx]
-            first_col = str(row[0]).strip() if pd.notna(row[0]) else ""
-
-            # Stop at next section
-            if first_col in ['Trades', 'Dividends', 'Withholding Tax', 'Fees', 'Interest']:
-                break
-
-            if pd.isna(row[0]):
+            if first_col not in _SECTION_NAMES:
                 continue
 
-            try:
-                # Map columns - adjust based on actual IBKR format
-                symbol = self._safe_str(row[1]) if len(row) > 1 else ''
-                currency = self._safe_str(row[2]) if len(row) > 2 else 'CHF'
-                quantity = self._safe_float(row[3]) if len(row) > 3 else 0. 0
-                price = self._safe_float(row[4]) if len(row) > 4 else 0. 0
-                value = self._safe_float(row[5]) if len(row) > 5 else 0. 0
-                unrealized_pl = self._safe_float(row[6]) if len(row) > 6 else 0. 0
-
-                if symbol and quantity != 0:
-                    self.open_positions.append({
-                        'symbol': symbol,
-                        'currency': currency,
-                        'quantity': quantity,
-                        'price': price,
-                        'value_chf': self._convert_to_chf(value, currency),
-                        'unrealized_pl': unrealized_pl
-                    })
-                    count += 1
-            except (ValueError, IndexError) as e:
-                logger.debug(f"Skipping row {idx}: {e}")
+            # Header rows (re)define the column layout of the section that follows
+            if discriminator == 'Header':
+                if current_block is not None:
+                    yield current_block
+                current_section = first_col
+                current_block = None
+                if current_section in wanted:
+                    header = {h.strip(): i for i, h in enumerate(row) if h != ''}
+                    required = _REQUIRED_COLUMNS[current_section]
+                    missing = [name for name in required if name not in header]
+                    if missing:
+                        logger.warning("⚠️ %s header at row %d lacks %s, skipping block",
+                                       current_section, idx, missing)
+                    else:
+                        # Data rows too short to hold every required column are malformed
+                        min_cols = max(header[name] for name in required) + 1
+                        current_rows = []
+                        current_block = (current_section, header, current_rows)
+                logger.debug("Found section: %s at row %d", current_section, idx)
                 continue
 
-        logger.info(f"✅ Processed {count} open positions")
-
-    def _convert_to_chf(self, amount: float, currency: str) -> float:
-        """Convert amount to CHF"""
-        if currency == 'CHF' or pd.isna(currency):
-            return amount
-
-        rate = self.fx_rates.get(currency, 1. 0)
-        return amount * rate
-
-    def _safe_float(self, value) -> float:
-        """Safely convert to float"""
-        if pd.isna(value) or value == '':
-            return 0.0
-        try:
-            return float(str(value).replace(',', '.'). strip())
-        except (ValueError, AttributeError):
-            return 0.0
-
-    def _safe_str(self, value) -> str:
-        """Safely convert to string"""
-        if pd.isna(value) or value == '':
-            return ''
-        return str(value).strip()
+            if (discriminator == 'Data' and first_col == current_section
+                    and current_block is not None and len(row) >= min_cols):
+                current_rows.append(row)
+
+        if current_block is not None:
+            yield current_block
+        logger.info("📂 Read CSV with %d rows", idx + 1)
+
+    def to_dataframe(self, name: str) -> 'pd.DataFrame':
+        """Return the columnar view of a data container (e.g. 'transactions') as a compact DataFrame"""
+        import pandas as pd
+
+        data = {}
+        for field, values in self.columns[name].items():
+            if field in _FLOAT32_FIELDS:
+                data[field] = values.astype(np.float32)
+            elif field in _CATEGORICAL_FIELDS:
+                data[field] = pd.Categorical(values)
+            else:
+                data[field] = values
+        return pd.DataFrame(data)
+
+    def _parse_block(self, section: str, header: Dict[str, int],
+                     rows: List[List[str]]) -> Dict[str, np.ndarray]:
+        """Turn the data rows of one header block into records per the section schema
+
+        The records and their per-field arrays are appended to the target container
+        and its columnar view; the block's arrays are also returned.
+        """
+        schema = _SECTION_SCHEMAS[section]
+        bulk = len(rows) >= _BULK_MIN_ROWS
+
+        values = {}
+        for field, column, convert in schema.columns:
+            cells = _column(rows, header.get(column))
+            if convert in _FLOAT_CONVERTERS:
+                if bulk:
+                    floats = _to_floats(cells)
+                    values[field] = np.abs(floats) if convert is _abs_float else floats
+                else:
+                    values[field] = np.fromiter(map(convert, cells), dtype=np.float64, count=len(cells))
+            else:
+                values[field] = _convert_distinct(convert, cells)
+
+        rates = np.array([self.fx_rates.get(c, 1.0) for c in values['currency']])
+        for chf_field, source in schema.chf:
+            values[chf_field] = values[source] * rates
+
+        keep = np.ones(len(rows), dtype=bool)
+        for field in schema.required:
+            column = values[field]
+            keep &= (column != 0) if isinstance(column, np.ndarray) else _non_empty(column)
+
+        # Fields not read from the statement take the schema constant or record default
+        defaults = {**schema.record._field_defaults, **dict(schema.constants)}
+        columns = {}
+        for field in schema.record._fields:
+            column = values.get(field)
+            if column is None:
+                column = np.full(len(rows), defaults[field], dtype=_field_dtype(field))
+            elif not isinstance(column, np.ndarray):
+                column = np.array(column, dtype=object)
+            columns[field] = column[keep]
+
+        records = list(map(schema.record._make, zip(*(column.tolist() for column in columns.values()))))
+
+        # Records and columns grow together block by block, so they stay in step
+        # even when reading fails partway through the statement
+        getattr(self, schema.target).extend(records)
+        self.columns[schema.target] = _concat_columns([self.columns[schema.target], columns],
+                                                      schema.record._fields)
+        return columns
 
     def calculate_summary(self):
         """Calculate tax summary"""
         logger.info("🧮 Calculating summary...")
 
+        tx = self.columns['transactions']
+        divs = self.columns['dividends']
+        is_interest = divs['type'] == 'Interest'
+
         # Capital gains
-        total_proceeds = sum([t['proceeds_chf'] for t in self. transactions if t['type'] == 'Stocks'])
-        total_commissions = sum([t['commission_chf'] for t in self.transactions])
+        total_proceeds = float(tx['proceeds_chf'][tx['type'] == 'Stocks'].sum())
+        total_commissions = float(tx['commission_chf'].sum())
 
         # Dividend income
-        total_dividends = sum([d['amount_chf'] for d in self.dividends if d. get('type') != 'Interest'])
+        total_dividends = float(divs['amount_chf'][~is_interest].sum())
 
         # Interest income
-        total_interest = sum([d['amount_chf'] for d in self.dividends if d.get('type') == 'Interest'])
+        total_interest = float(divs['amount_chf'][is_interest].sum())
 
         # Withholding taxes
-        total_taxes = sum([t['amount_chf'] for t in self.taxes])
+        total_taxes = float(self.columns['taxes']['amount_chf'].sum())
 
         # Forex gains
-        total_forex = sum([t['proceeds_chf'] for t in self.transactions if t['type'] == 'Forex'])
+        total_forex = float(tx['proceeds_chf'][tx['type'] == 'Forex'].sum())
 
         # Open positions value
-        total_open_value = sum([p['value_chf'] for p in self.open_positions])
+        total_open_value = float(self.columns['open_positions']['value_chf'].sum())
 
         self.summary = {
             'tax_year': self.tax_year,
@@ -536,319 +683,198 @@ class IBKRTaxProcessor:
             'report_date': datetime.now().strftime('%Y-%m-%d')
         }
 
+        # Amounts as shown in the reports, formatted once for both Excel and HTML
+        self.summary_text = {key: f"{value:.2f}" for key, value in self.summary.items()
+                             if isinstance(value, float)}
+
         logger.info("✅ Summary calculated")
 
     def generate_excel_report(self, output_file: str = 'tax_report_2025.xlsx'):
         """Generate comprehensive Excel report"""
-        logger.info(f"📊 Generating Excel report: {output_file}")
+        logger.info("📊 Generating Excel report: %s", output_file)
+
+        from openpyxl import Workbook
+
+        # Write-only workbooks stream each sheet's rows instead of keeping a cell model
+        wb = Workbook(write_only=True)
 
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            # Sheet 1: Summary
-            self._write_summary_sheet(writer)
+        # Sheet 1: Summary
+        self._write_summary_sheet(wb)
 
-            # Sheet 2: Detailed Trades
-            self._write_trades_sheet(writer)
+        # Sheet 2: Detailed Trades
+        self._write_trades_sheet(wb)
 
-            # Sheet 3: Forex
-            self._write_forex_sheet(writer)
+        # Sheets 3 and 7 each need a subset of the trades; collect both in one pass
+        forex, commissions = self._split_transactions()
 
-            # Sheet 4: Dividends & Taxes
-            self._write_dividends_sheet(writer)
+        # Sheet 3: Forex
+        self._write_forex_sheet(wb, forex)
 
-            # Sheet 5: Interest
-            self._write_interest_sheet(writer)
+        # Sheets 4-5 split the same records, so partition them once
+        divs, interests = self._split_income()
 
-            # Sheet 6: Open Positions
-            self._write_positions_sheet(writer)
+        # Sheet 4: Dividends & Taxes
+        self._write_dividends_sheet(wb, divs)
 
-            # Sheet 7: Costs & Fees
-            self._write_fees_sheet(writer)
+        # Sheet 5: Interest
+        self._write_interest_sheet(wb, interests)
 
-        logger.info(f"✅ Excel report generated: {output_file}")
+        # Sheet 6: Open Positions
+        self._write_positions_sheet(wb)
 
-    def _write_summary_sheet(self, writer):
+        # Sheet 7: Costs & Fees
+        self._write_fees_sheet(wb, commissions)
+
+        # Build the zip container in memory and hand it to the filesystem in one write
+        buffer = BytesIO()
+        wb.save(buffer)
+        Path(output_file).write_bytes(buffer.getvalue())
+        logger.info("✅ Excel report generated: %s", output_file)
+
+    def _write_summary_sheet(self, wb):
         """Write summary sheet"""
+        summary = self.summary
+        text = self.summary_text
         summary_data = [
             ['RAPORT PODATKOWY - BASEL-LANDSCHAFT', ''],
             ['', ''],
-            ['Rok podatkowy:', self.summary['tax_year']],
-            ['Kanton:', self.summary['canton']],
-            ['Data raportu:', self.summary['report_date']],
+            ['Rok podatkowy:', summary['tax_year']],
+            ['Kanton:', summary['canton']],
+            ['Data raportu:', summary['report_date']],
             ['', ''],
             ['PRZYCHODY', 'CHF'],
-            ['Dywidendy (brutto):', f"{self.summary['total_dividends']:.2f}"],
-            ['Odsetki:', f"{self.summary['total_interest']:.2f}"],
-            ['Zyski z forex:', f"{self.summary['total_forex_gains']:.2f}"],
+            ['Dywidendy (brutto):', text['total_dividends']],
+            ['Odsetki:', text['total_interest']],
+            ['Zyski z forex:', text['total_forex_gains']],
             ['', ''],
             ['KOSZTY', 'CHF'],
-            ['Prowizje i opłaty:', f"{self.summary['total_commissions']:.2f}"],
+            ['Prowizje i opłaty:', text['total_commissions']],
             ['', ''],
             ['PODATKI U ŹRÓDŁA', 'CHF'],
-            ['Całkowite podatki u źródła:', f"{self.summary['total_withholding_taxes']:.2f}"],
+            ['Całkowite podatki u źródła:', text['total_withholding_taxes']],
             ['', ''],
             ['POZYCJE OTWARTE', 'CHF'],
-            ['Łączna wartość pozycji:', f"{self.summary['total_open_positions_value']:.2f}"],
+            ['Łączna wartość pozycji:', text['total_open_positions_value']],
         ]
 
-        df_summary = pd.DataFrame(summary_data)
-        df_summary.to_excel(writer, sheet_name='PODSUMOWANIE', index=False, header=False)
+        ws = wb.create_sheet('PODSUMOWANIE')
+        for row in summary_data:
+            # Empty cells are left blank rather than written as empty strings
+            ws.append([value if value != '' else None for value in row])
 
-    def _write_trades_sheet(self, writer):
+    def _write_trades_sheet(self, wb):
         """Write trades sheet"""
-        trades_df = pd.DataFrame(self.transactions)
-        if len(trades_df) > 0:
-            trades_df = trades_df[['date', 'type', 'symbol', 'quantity', 'price', 'proceeds_chf', 'commission_chf']]
-            trades_df. columns = ['Data', 'Typ', 'Symbol', 'Ilość', 'Cena', 'Wartość CHF', 'Komisja CHF']
-            trades_df. to_excel(writer, sheet_name='TRANSAKCJE_SZCZEGÓŁOWE', index=False)
+        if self.transactions:
+            _emit_sheet(wb, 'TRANSAKCJE_SZCZEGÓŁOWE', _TRADES_HEADER,
+                        ((t.date, t.type, t.symbol, t.quantity, t.price, t.proceeds_chf, t.commission_chf)
+                         for t in self.transactions))
+
+    def _split_transactions(self) -> Tuple[List[Trade], List[Trade]]:
+        """Collect (forex trades, trades with a commission) in one pass over self.transactions"""
+        forex, commissions = [], []
+        for t in self.transactions:
+            if t.type == 'Forex':
+                forex.append(t)
+            if t.commission_chf > 0:
+                commissions.append(t)
+        return forex, commissions
 
-    def _write_forex_sheet(self, writer):
+    def _write_forex_sheet(self, wb, forex: List[Trade]):
         """Write forex sheet"""
-        forex_df = pd.DataFrame(self.transactions)
-        if len(forex_df) > 0:
-            forex_df = forex_df[forex_df['type'] == 'Forex']
-            if len(forex_df) > 0:
-                forex_df = forex_df[['date', 'symbol', 'quantity', 'proceeds_chf']]
-                forex_df.columns = ['Data', 'Para walut', 'Ilość', 'Wartość CHF']
-                forex_df.to_excel(writer, sheet_name='FOREX', index=False)
-
-    def _write_dividends_sheet(self, writer):
+        if forex:
+            _emit_sheet(wb, 'FOREX', _FOREX_HEADER,
+                        ((t.date, t.symbol, t.quantity, t.proceeds_chf) for t in forex))
+
+    def _split_income(self) -> Tuple[List[Dividend], List[Dividend]]:
+        """Partition self.dividends into (dividends, interest) in one pass"""
+        divs, interests = [], []
+        for d in self.dividends:
+            (interests if d.type == 'Interest' else divs).append(d)
+        return divs, interests
+
+    def _write_dividends_sheet(self, wb, divs: List[Dividend]):
         """Write dividends sheet"""
-        divs = [d for d in self.dividends if d.get('type') != 'Interest']
         if divs:
-            div_df = pd.DataFrame(divs)
-            div_df = div_df[['date', 'currency', 'amount', 'amount_chf']]
-            div_df.columns = ['Data', 'Waluta', 'Kwota', 'CHF']
-            div_df. to_excel(writer, sheet_name='DYWIDENDY', index=False)
+            _emit_sheet(wb, 'DYWIDENDY', _INCOME_HEADER,
+                        ((d.date, d.currency, d.amount, d.amount_chf) for d in divs))
 
-    def _write_interest_sheet(self, writer):
+    def _write_interest_sheet(self, wb, interests: List[Dividend]):
         """Write interest sheet"""
-        interests = [d for d in self. dividends if d.get('type') == 'Interest']
         if interests:
-            int_df = pd.DataFrame(interests)
-            int_df = int_df[['date', 'currency', 'amount', 'amount_chf']]
-            int_df.columns = ['Data', 'Waluta', 'Kwota', 'CHF']
-            int_df. to_excel(writer, sheet_name='ODSETKI', index=False)
+            _emit_sheet(wb, 'ODSETKI', _INCOME_HEADER,
+                        ((d.date, d.currency, d.amount, d.amount_chf) for d in interests))
 
-    def _write_positions_sheet(self, writer):
+    def _write_positions_sheet(self, wb):
         """Write open positions sheet"""
         if self.open_positions:
-            pos_df = pd.DataFrame(self.open_positions)
-            pos_df = pos_df[['symbol', 'quantity', 'value_chf', 'unrealized_pl']]
-            pos_df.columns = ['Symbol', 'Ilość', 'Wartość CHF', 'P&L niezrealizowany']
-            pos_df.to_excel(writer, sheet_name='POZYCJE_OTWARTE', index=False)
+            _emit_sheet(wb, 'POZYCJE_OTWARTE', _POSITIONS_HEADER,
+                        ((p.symbol, p.quantity, p.value_chf, p.unrealized_pl) for p in self.open_positions))
 
-    def _write_fees_sheet(self, writer):
+    def _write_fees_sheet(self, wb, commissions: List[Trade]):
         """Write fees sheet"""
-        all_fees = []
-
-        # Add trading commissions
-        for t in self.transactions:
-            if t['commission_chf'] > 0:
-                all_fees.append({
-                    'date': t['date'],
-                    'type': 'Komisja',
-                    'symbol': t['symbol'],
-                    'amount_chf': t['commission_chf']
-                })
-
-        # Add other fees
-        for f in self. fees:
-            all_fees. append({
-                'date': f['date'],
-                'type': f. get('type', 'Opłata'),
-                'symbol': '',
-                'amount_chf': f['amount_chf']
-            })
-
-        if all_fees:
-            fees_df = pd.DataFrame(all_fees)
-            fees_df = fees_df[['date', 'type', 'symbol', 'amount_chf']]
-            fees_df.columns = ['Data', 'Typ', 'Symbol', 'CHF']
-            fees_df. to_excel(writer, sheet_name='KOSZTY', index=False)
+        if commissions or self.fees:
+            _emit_sheet(wb, 'KOSZTY', _FEES_HEADER, chain(
+                # Trading commissions
+                ((t.date, 'Komisja', t.symbol, t.commission_chf) for t in commissions),
+                # Other fees
+                ((f.date, f.type, '', f.amount_chf) for f in self.fees)))
 
     def generate_html_report(self, output_file: str = 'tax_report_2025.html'):
         """Generate HTML preview report"""
-        logger.info(f"🌐 Generating HTML report: {output_file}")
+        logger.info("🌐 Generating HTML report: %s", output_file)
+        summary = self.summary
+        text = self.summary_text
 
-        html = f"""<! DOCTYPE html>
+        html = f"""<!DOCTYPE html>
 <html lang="pl">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Raport Podatkowy IBKR - {self.tax_year}</title>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 20px;
-            min-height: 100vh;
-        }}
-
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 10px;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
-            overflow: hidden;
-        }}
-
-        .header {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 40px;
-            text-align: center;
-        }}
-
-        .header h1 {{
-            font-size: 2.5em;
-            margin-bottom: 10px;
-        }}
-
-        .header p {{
-            font-size: 1.1em;
-            opacity: 0.9;
-        }}
-
-        .content {{
-            padding: 40px;
-        }}
-
-        . summary-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 20px;
-            margin-bottom: 40px;
-        }}
-
-        .summary-card {{
-            background: #f8f9fa;
-            border-left: 4px solid #667eea;
-            padding: 20px;
-            border-radius: 5px;
-        }}
-
-        . summary-card h3 {{
-            color: #667eea;
-            font-size: 0.9em;
-            text-transform: uppercase;
-            margin-bottom: 10px;
-        }}
-
-        .summary-card . value {{
-            font-size: 1.8em;
-            font-weight: bold;
-            color: #333;
-        }}
-
-        .summary-card .unit {{
-            color: #999;
-            font-size: 0.9em;
-        }}
-
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
-        }}
-
-        table thead {{
-            background: #f8f9fa;
-        }}
-
-        table th {{
-            padding: 12px;
-            text-align: left;
-            font-weight: 600;
-            color: #667eea;
-            border-bottom: 2px solid #667eea;
-        }}
-
-        table td {{
-            padding: 12px;
-            border-bottom: 1px solid #eee;
-        }}
-
-        table tbody tr:hover {{
-            background: #f8f9fa;
-        }}
-
-        .section-title {{
-            font-size: 1.5em;
-            color: #667eea;
-            margin-top: 40px;
-            margin-bottom: 20px;
-            border-bottom: 2px solid #667eea;
-            padding-bottom: 10px;
-        }}
-
-        .footer {{
-            background: #f8f9fa;
-            padding: 20px;
-            text-align: center;
-            color: #999;
-            font-size: 0.9em;
-            border-top: 1px solid #eee;
-            margin-top: 40px;
-        }}
-
-        .positive {{
-            color: #28a745;
-        }}
-
-        .negative {{
-            color: #dc3545;
-        }}
-    </style>
+    <style>{_HTML_STYLE}    </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
             <h1>Raport Podatkowy IBKR</h1>
-            <p>Canton Basel-Landschaft | Rok: {self.summary['tax_year']}</p>
+            <p>Canton Basel-Landschaft | Rok: {summary['tax_year']}</p>
         </div>
 
         <div class="content">
             <div class="summary-grid">
                 <div class="summary-card">
                     <h3>Dywidendy (brutto)</h3>
-                    <div class="value positive">{self.summary['total_dividends']:. 2f}</div>
+                    <div class="value positive">{text['total_dividends']}</div>
                     <div class="unit">CHF</div>
                 </div>
 
                 <div class="summary-card">
                     <h3>Odsetki</h3>
-                    <div class="value positive">{self.summary['total_interest']:.2f}</div>
+                    <div class="value positive">{text['total_interest']}</div>
                     <div class="unit">CHF</div>
                 </div>
 
                 <div class="summary-card">
                     <h3>Zyski z Forex</h3>
-                    <div class="value">{self.summary['total_forex_gains']:.2f}</div>
+                    <div class="value">{text['total_forex_gains']}</div>
                     <div class="unit">CHF</div>
                 </div>
 
                 <div class="summary-card">
                     <h3>Koszty (prowizje)</h3>
-                    <div class="value negative">-{self.summary['total_commissions']:.2f}</div>
+                    <div class="value negative">-{text['total_commissions']}</div>
                     <div class="unit">CHF</div>
                 </div>
 
                 <div class="summary-card">
                     <h3>Podatki u źródła</h3>
-                    <div class="value negative">-{self.summary['total_withholding_taxes']:.2f}</div>
+                    <div class="value negative">-{text['total_withholding_taxes']}</div>
                     <div class="unit">CHF</div>
                 </div>
 
                 <div class="summary-card">
                     <h3>Pozycje otwarte</h3>
-                    <div class="value">{self.summary['total_open_positions_value']:.2f}</div>
+                    <div class="value">{text['total_open_positions_value']}</div>
                     <div class="unit">CHF</div>
                 </div>
             </div>
@@ -864,7 +890,7 @@ class IBKRTaxProcessor:
         </div>
 
         <div class="footer">
-            <p>Raport wygenerowany: {self.summary['report_date']} | IBKR Tax Processor v2.0</p>
+            <p>Raport wygenerowany: {summary['report_date']} | IBKR Tax Processor v2.0</p>
             <p>Basel-Landschaft | Szwajcaria</p>
         </div>
     </div>
@@ -872,28 +898,25 @@ class IBKRTaxProcessor:
 </html>
 """
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        Path(output_file).write_text(html, encoding='utf-8')
 
-        logger.info(f"✅ HTML report generated: {output_file}")
+        logger.info("✅ HTML report generated: %s", output_file)
 
     def _generate_trades_table(self) -> str:
         """Generate trades HTML table"""
         if not self.transactions:
             return "<p>Brak transakcji</p>"
 
-        rows = ""
-        for t in self.transactions[:20]:  # Show first 20
-            rows += f"""
+        rows = "".join(f"""
             <tr>
-                <td>{t['date']}</td>
-                <td>{t['symbol']}</td>
-                <td>{t['quantity']:. 2f}</td>
-                <td>{t['price']:.2f}</td>
-                <td>{t['proceeds_chf']:.2f}</td>
-                <td>{t['commission_chf']:.2f}</td>
+                <td>{t.date}</td>
+                <td>{t.symbol}</td>
+                <td>{t.quantity:.2f}</td>
+                <td>{t.price:.2f}</td>
+                <td>{t.proceeds_chf:.2f}</td>
+                <td>{t.commission_chf:.2f}</td>
             </tr>
-            """
+            """ for t in self.transactions[:20])  # Show first 20
 
         return f"""
         <table>
@@ -915,20 +938,18 @@ class IBKRTaxProcessor:
 
     def _generate_dividends_table(self) -> str:
         """Generate dividends HTML table"""
-        divs = [d for d in self.dividends if d. get('type') != 'Interest']
+        divs = [d for d in self.dividends if d.type != 'Interest']
         if not divs:
             return "<p>Brak dywidend</p>"
 
-        rows = ""
-        for d in divs[:20]:
-            rows += f"""
+        rows = "".join(f"""
             <tr>
-                <td>{d['date']}</td>
-                <td>{d. get('symbol', '')}</td>
-                <td>{d['currency']}</td>
-                <td class="positive">{d['amount_chf']:.2f}</td>
+                <td>{d.date}</td>
+                <td>{d.symbol}</td>
+                <td>{d.currency}</td>
+                <td class="positive">{d.amount_chf:.2f}</td>
             </tr>
-            """
+            """ for d in divs[:20])
 
         return f"""
         <table>
@@ -951,16 +972,14 @@ class IBKRTaxProcessor:
         if not self.open_positions:
             return "<p>Brak otwartych pozycji</p>"
 
-        rows = ""
-        for p in self.open_positions:
-            rows += f"""
+        rows = "".join(f"""
             <tr>
-                <td>{p['symbol']}</td>
-                <td>{p['quantity']:.2f}</td>
-                <td>{p['value_chf']:.2f}</td>
-                <td>{p['unrealized_pl']:.2f}</td>
+                <td>{p.symbol}</td>
+                <td>{p.quantity:.2f}</td>
+                <td>{p.value_chf:.2f}</td>
+                <td>{p.unrealized_pl:.2f}</td>
             </tr>
-            """
+            """ for p in self.open_positions)
 
         return f"""
         <table>
@@ -980,23 +999,23 @@ class IBKRTaxProcessor:
 
     def process(self):
         """Main processing pipeline"""
-        logger.info(f"🔄 Przetwarzanie raportu IBKR dla {self.canton}...")
-        logger.info(f"📂 Plik: {self.csv_file}")
+        logger.info("🔄 Przetwarzanie raportu IBKR dla %s...", self.canton)
+        logger.info("📂 Plik: %s", self.csv_file)
 
         self.parse_ibkr_statement()
-        logger.info(f"✅ Sparsowano {len(self.transactions)} transakcji")
-        logger.info(f"✅ Sparsowano {len(self.dividends)} dywidend/odsetek")
-        logger.info(f"✅ Sparsowano {len(self.taxes)} pozycji podatków")
+        logger.info("✅ Sparsowano %d transakcji", len(self.transactions))
+        logger.info("✅ Sparsowano %d dywidend/odsetek", len(self.dividends))
+        logger.info("✅ Sparsowano %d pozycji podatków", len(self.taxes))
 
         self.calculate_summary()
-        logger.info(f"✅ Obliczono podsumowanie")
+        logger.info("✅ Obliczono podsumowanie")
 
         self.generate_excel_report()
         self.generate_html_report()
 
-        logger.info(f"\n✨ Raport został wygenerowany!")
-        logger.info(f"   📊 Excel: tax_report_2025.xlsx")
-        logger.info(f"   🌐 HTML: tax_report_2025.html")
+        logger.info("\n✨ Raport został wygenerowany!")
+        logger.info("   📊 Excel: tax_report_2025.xlsx")
+        logger.info("   🌐 HTML: tax_report_2025.html")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ibkr_processor  # noqa: E402
+from ibkr_processor import _BULK_MIN_ROWS, IBKRTaxProcessor  # noqa: E402
+
+logging.disable(logging.INFO)
+
+STATEMENT = '''Statement,Header,Field Name,Field Value
+Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,Date/Time,Quantity,T. Price,C. Price,Proceeds,Comm/Fee
+Trades,Data,Order,Stocks,USD,AAPL,"2025-01-10, 10:00:00",10,150.00,150.00,"-1,500.00",-1.00
+Dividends,Header,Currency,Date,Description,Amount
+Dividends,Data,USD,2025-02-14,AAPL(US0378331005) Cash Dividend USD 0.25 per Share,2.50
+'''
+
+USD = IBKRTaxProcessor.DEFAULT_FX_RATES['USD']
+
+
+@pytest.fixture
+def processor(tmp_path):
+    csv_file = tmp_path / 'statement.csv'
+    csv_file.write_text(STATEMENT, encoding='utf-8')
+    return IBKRTaxProcessor(str(csv_file))
+
+
+def test_summary_before_parsing_is_zero(processor):
+    processor.calculate_summary()
+    assert processor.summary['total_proceeds'] == 0.0
+    assert processor.summary['total_dividends'] == 0.0
+
+
+def test_subset_parses_keep_columns_and_records_in_step(processor):
+    processor.parse_ibkr_statement(['Trades'])
+    processor.parse_ibkr_statement(['Dividends'])
+
+    assert len(processor.transactions) == len(processor.columns['transactions']['proceeds_chf']) == 1
+    assert len(processor.dividends) == len(processor.columns['dividends']['amount_chf']) == 1
+
+    processor.calculate_summary()
+    assert processor.summary['total_proceeds'] == pytest.approx(-1500.0 * USD)
+    assert processor.summary['total_dividends'] == pytest.approx(2.5 * USD)
+
+
+def test_repeated_parse_accumulates_columns_with_records(processor):
+    processor.parse_ibkr_statement()
+    processor.parse_ibkr_statement()
+
+    assert len(processor.transactions) == len(processor.columns['transactions']['proceeds_chf']) == 2
+    processor.calculate_summary()
+    assert processor.summary['total_proceeds'] == pytest.approx(-3000.0 * USD)
+
+
+def test_unknown_section_is_rejected(processor):
+    with pytest.raises(ValueError):
+        processor.parse_ibkr_statement(['Nope'])
+
+
+def test_failed_read_keeps_records_and_columns_in_step(tmp_path):
+    # The trades block is closed by the next header; the invalid byte sits far
+    # enough behind it that decoding fails only after the block was parsed
+    padding = 'Notes,Data,' + 'x' * 100 + '\n'
+    data = (STATEMENT + padding * 2000).encode('utf-8') + b'Notes,Data,\xff\n'
+    csv_file = tmp_path / 'corrupt.csv'
+    csv_file.write_bytes(data)
+    processor = IBKRTaxProcessor(str(csv_file))
+
+    with pytest.raises(UnicodeDecodeError):
+        processor.parse_ibkr_statement()
+
+    assert len(processor.transactions) == 1
+    assert len(processor.transactions) == len(processor.columns['transactions']['proceeds_chf'])
+    assert len(processor.dividends) == len(processor.columns['dividends']['amount_chf'])
+    processor.calculate_summary()
+    assert processor.summary['total_proceeds'] == pytest.approx(-1500.0 * USD)
+
+
+@pytest.mark.parametrize('rows', [1, _BULK_MIN_ROWS])
+def test_non_finite_amounts_count_as_zero(tmp_path, rows):
+    dividends = ['Dividends,Header,Currency,Date,Description,Amount']
+    dividends += ['Dividends,Data,USD,2025-02-14,AAPL(US0378331005) Cash Dividend,2.50'] * rows
+    dividends += ['Dividends,Data,USD,2025-03-14,MSFT(US5949181045) Cash Dividend,NaN',
+                  'Dividends,Data,USD,2025-04-14,MSFT(US5949181045) Cash Dividend,inf']
+    csv_file = tmp_path / 'statement.csv'
+    csv_file.write_text('\n'.join(dividends) + '\n', encoding='utf-8')
+    processor = IBKRTaxProcessor(str(csv_file))
+
+    processor.parse_ibkr_statement()
+    processor.calculate_summary()
+
+    # Zero amounts fail the keep mask, so the non-finite rows are dropped
+    assert len(processor.dividends) == rows
+    assert processor.summary['total_dividends'] == pytest.approx(2.5 * USD * rows)
+
+
+# Numeric cells as IBKR writes them: thousands separators, signs, blanks, and
+# values with more digits than a double holds (where rounding paths can differ)
+NUMBERS = ['"-1,166"', '242', '"494,232.42"', '-60069.24', '0.1', '', '-0.0000001',
+           '1234.5678901234567', '"12,345,678.9"', '-1.00', '3', '" 7.5 "']
+
+
+def _parity_statement():
+    lines = ['Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,'
+             'Date/Time,Quantity,T. Price,Proceeds,Comm/Fee']
+    lines += [f'Trades,Data,Order,Stocks,{"USD" if i % 3 else "EUR"},SYM{i % 7},"2025-01-{i % 28 + 1:02d}",'
+              f'{NUMBERS[i % 12]},{NUMBERS[(i + 3) % 12]},{NUMBERS[(i + 5) % 12]},{NUMBERS[(i + 7) % 12]}'
+              for i in range(_BULK_MIN_ROWS + 20)]
+    lines.append('Withholding Tax,Header,Currency,Date,Description,Amount')
+    lines += [f'Withholding Tax,Data,USD,2025-02-{i % 28 + 1:02d},SYM{i % 7}(US000) Tax,{NUMBERS[i % 12]}'
+              for i in range(_BULK_MIN_ROWS)]
+    lines.append('Fees,Header,Currency,Date,Description,Amount')
+    lines += [f'Fees,Data,CHF,2025-03-{i % 28 + 1:02d},Fee {i % 4},{NUMBERS[(i + 1) % 12]}'
+              for i in range(_BULK_MIN_ROWS)]
+    return '\n'.join(lines) + '\n'
+
+
+def _parse(path):
+    processor = IBKRTaxProcessor(str(path))
+    processor.parse_ibkr_statement()
+    records = {name: getattr(processor, name) for name in ('transactions', 'taxes', 'fees')}
+    columns = {name: {field: values.tolist() for field, values in processor.columns[name].items()}
+               for name in records}
+    return records, columns
+
+
+def test_bulk_and_per_cell_conversion_agree(tmp_path, monkeypatch):
+    csv_file = tmp_path / 'statement.csv'
+    csv_file.write_text(_parity_statement(), encoding='utf-8')
+
+    bulk = _parse(csv_file)
+    monkeypatch.setattr(ibkr_processor, '_BULK_MIN_ROWS', 10 ** 9)
+    per_cell = _parse(csv_file)
+
+    assert bulk == per_cell
+    records = bulk[0]
+    assert records['transactions'] and records['taxes'] and records['fees']
+    # Taxes and fees are stored as absolute amounts on both paths
+    assert all(t.amount > 0 for t in records['taxes'])
+    assert all(f.amount > 0 for f in records['fees'])
+
+
+def _parse_text(csv_file, text):
+    csv_file.write_text(text, encoding='utf-8')
+    processor = IBKRTaxProcessor(str(csv_file))
+    processor.parse_ibkr_statement()
+    return processor
+
+
+def test_reordered_header_parses_to_same_records(tmp_path):
+    reordered = '''Trades,Header,DataDiscriminator,Symbol,Comm/Fee,Proceeds,Currency,T. Price,Quantity,Asset Category,Date/Time
+Trades,Data,Order,AAPL,-1.00,"-1,500.00",USD,150.00,10,Stocks,"2025-01-10, 10:00:00"
+Dividends,Header,Amount,Description,Date,Currency
+Dividends,Data,2.50,AAPL(US0378331005) Cash Dividend USD 0.25 per Share,2025-02-14,USD
+'''
+    expected = _parse_text(tmp_path / 'original.csv', STATEMENT)
+    actual = _parse_text(tmp_path / 'reordered.csv', reordered)
+
+    assert actual.transactions == expected.transactions
+    assert actual.dividends == expected.dividends
+    assert len(actual.transactions) == len(actual.dividends) == 1
+
+
+def test_block_missing_required_column_is_skipped(tmp_path, caplog):
+    text = '''Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,Date/Time,T. Price,Proceeds
+Trades,Data,Order,Stocks,USD,AAPL,"2025-01-10, 10:00:00",150.00,"-1,500.00"
+Dividends,Header,Currency,Date,Description,Amount
+Dividends,Data,USD,2025-02-14,AAPL(US0378331005) Cash Dividend USD 0.25 per Share,2.50
+'''
+    with caplog.at_level(logging.WARNING):
+        processor = _parse_text(tmp_path / 'statement.csv', text)
+
+    assert processor.transactions == []
+    assert len(processor.dividends) == 1
+    assert any('Trades' in r.getMessage() and 'Quantity' in r.getMessage() for r in caplog.records)
+
+
+def test_rows_shorter_than_header(tmp_path):
+    text = '''Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,Date/Time,Quantity,T. Price,Proceeds,Comm/Fee
+Trades,Data,Order,Stocks,USD,AAPL,"2025-01-10, 10:00:00",10,150.00
+Trades,Data,Order,Stocks,USD,MSFT,"2025-01-11, 10:00:00"
+'''
+    processor = _parse_text(tmp_path / 'statement.csv', text)
+
+    # A row holding every required column is kept and its missing cells read as
+    # empty; a row cut off before a required column is dropped
+    assert [t.symbol for t in processor.transactions] == ['AAPL']
+    trade = processor.transactions[0]
+    assert (trade.quantity, trade.price, trade.proceeds, trade.commission) == (10.0, 150.0, 0.0, 0.0)
+    assert len(processor.columns['transactions']['proceeds_chf']) == 1
+
+
+def test_to_dataframe_keeps_forex_quantities_exact(tmp_path):
+    text = '''Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,Date/Time,Quantity,T. Price,Proceeds,Comm/Fee
+Trades,Data,Order,Forex,CHF,EUR.CHF,"2025-01-10, 10:00:00","1,234,567.89",0.93,"-1,148,148.14",-2.00
+'''
+    processor = _parse_text(tmp_path / 'statement.csv', text)
+
+    df = processor.to_dataframe('transactions')
+    assert df['quantity'].iloc[0] == 1234567.89